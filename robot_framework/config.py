@@ -1,4 +1,6 @@
 """This module contains configuration constants used across the framework"""
+import os
+
 from itk_dev_shared_components.kmd_nova.nova_objects import Caseworker
 
 # The number of times the robot retries on an error before terminating.
@@ -31,6 +33,43 @@ QUEUE_NAME = "Masseoprettelse i KMD Nova"
 # The limit on how many queue elements to process
 MAX_TASK_COUNT = 1000
 
+# How queue elements are claimed: "fifo" in creation order or "fair_share" interleaved across jobs
+QUEUE_SCHEDULING = "fair_share"
+
+# The number of claims between each read of newly created queue elements in fair share mode, so new jobs are picked up
+SCHEDULER_REFRESH_INTERVAL = 100
+
+# The number of queue elements read per request when rereading the queue
+SCHEDULER_PAGE_SIZE = 1000
+
+# The share of claims each job gets in fair share mode, keyed by the optional "Prioritet" field from the form
+JOB_PRIORITY_WEIGHTS = {
+    "Høj": 4,
+    "Normal": 2,
+    "Lav": 1,
+}
+DEFAULT_JOB_PRIORITY = "Normal"
+
+# The longest time it can take to create all queue elements of a job, used to look for elements handled in earlier runs
+JOB_CREATION_WINDOW_MINUTES = 30
+
+# Run metrics
+# ----------------------
+
+# The folder the metrics files are written to at the end of every run.
+# OpenOrchestrator deletes the folder of the robot after each run, so this must be an absolute path outside it.
+# Can be overridden with the "metrics_folder" key in the process arguments.
+METRICS_FOLDER = os.path.join(os.path.expanduser("~"), "Robot Metrics", "Masseoprettelse KMD Nova")
+
+# The prefix of all metric names and metrics file names
+METRICS_PREFIX = "masseoprettelse_kmd_nova"
+
+# The upper bounds in seconds of the latency histogram buckets
+METRICS_HISTOGRAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# The upper bounds in seconds of the job queue wait and completion histogram buckets, from 1 minute to 24 hours
+METRICS_JOB_HISTOGRAM_BUCKETS = (60, 300, 900, 1800, 3600, 7200, 14400, 28800, 86400)
+
 # ----------------------
 # KMD Dictionaries
 KMD_DEPARTMENTS = {
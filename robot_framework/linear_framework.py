@@ -12,6 +12,7 @@ from robot_framework import reset
 from robot_framework.exceptions import BusinessError, handle_error, log_exception
 from robot_framework import process
 from robot_framework import config
+from robot_framework.metrics import RunMetrics, get_metrics_folder
 
 
 def main():
@@ -22,12 +23,14 @@ def main():
     orchestrator_connection.log_trace("Robot Framework started.")
     initialize.initialize(orchestrator_connection)
 
+    metrics = RunMetrics()
+
     queue_element_count = [0]  # A count of queue elements to keep the robot from running for too long, in a list to make it mutable.
     error_count = 0
     for _ in range(config.MAX_RETRY_COUNT):
         try:
             reset.reset(orchestrator_connection)
-            process.process(orchestrator_connection, queue_element_count)
+            process.process(orchestrator_connection, queue_element_count, metrics)
             break
 
         # If any business rules are broken the robot should stop entirely.
@@ -45,5 +48,13 @@ def main():
     reset.close_all(orchestrator_connection)
     reset.kill_all(orchestrator_connection)
 
+    metrics.increment("process_errors_total", error_count)
+    # Failing to write metrics should not change the result of the run.
+    try:
+        prometheus_path, summary_path = metrics.write(get_metrics_folder(orchestrator_connection), orchestrator_connection.process_name)
+        orchestrator_connection.log_trace(f"Run metrics written to {prometheus_path} and {summary_path}.")
+    except OSError as error:
+        orchestrator_connection.log_error(f"Run metrics could not be written: {repr(error)}")
+
     if config.FAIL_ROBOT_ON_TOO_MANY_ERRORS and error_count == config.MAX_RETRY_COUNT:
         raise RuntimeError("Process failed too many times.")
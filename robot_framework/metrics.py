@@ -0,0 +1,174 @@
+"""This module collects counters and histograms across a robot run and exports them as
+a Prometheus text-format file and a compact JSON summary."""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+
+from robot_framework import config
+
+
+class RunMetrics:
+    """Counters and histograms recorded during a single run of the robot.
+    Each metric is identified by its name and a set of labels.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.counters: dict[tuple[str, tuple], float] = {}
+        self.histograms: dict[tuple[str, tuple], list[float]] = {}
+        self.buckets: dict[str, tuple[float, ...]] = {}
+
+    def increment(self, name: str, amount: float = 1, **labels: str) -> None:
+        """Increase a counter.
+
+        Args:
+            name: The name of the counter.
+            amount: How much to increase the counter by.
+            labels: Labels identifying the series of the counter.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = config.METRICS_HISTOGRAM_BUCKETS, **labels: str) -> None:
+        """Record a single observation in a histogram.
+
+        Args:
+            name: The name of the histogram.
+            value: The observed value.
+            buckets: The upper bounds of the histogram buckets. The buckets of the first observation of a histogram are used.
+            labels: Labels identifying the series of the histogram.
+        """
+        self.buckets.setdefault(name, buckets)
+        key = (name, tuple(sorted(labels.items())))
+        self.histograms.setdefault(key, []).append(value)
+
+    @contextmanager
+    def time(self, name: str, **labels: str):
+        """Time the body of a with-statement and record the duration in seconds in a histogram.
+
+        Args:
+            name: The name of the histogram.
+            labels: Labels identifying the series of the histogram.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def to_prometheus(self) -> str:
+        """Format all metrics in the Prometheus text exposition format.
+
+        Returns:
+            The metrics as a string ready to be written to a .prom file.
+        """
+        lines = []
+
+        for name in sorted({name for name, _ in self.counters}):
+            full_name = f"{config.METRICS_PREFIX}_{name}"
+            lines.append(f"# TYPE {full_name} counter")
+            for (series_name, labels), value in sorted(self.counters.items()):
+                if series_name == name:
+                    lines.append(f"{full_name}{_format_labels(labels)} {value:g}")
+
+        for name in sorted({name for name, _ in self.histograms}):
+            full_name = f"{config.METRICS_PREFIX}_{name}"
+            lines.append(f"# TYPE {full_name} histogram")
+            for (series_name, labels), values in sorted(self.histograms.items()):
+                if series_name != name:
+                    continue
+                for bucket in self.buckets[name]:
+                    count = sum(1 for value in values if value <= bucket)
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', f'{bucket:g}'),))} {count}")
+                lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {len(values)}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {sum(values):g}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {len(values)}")
+
+        duration = (datetime.now() - self.started_at).total_seconds()
+        lines.append(f"# TYPE {config.METRICS_PREFIX}_run_duration_seconds gauge")
+        lines.append(f"{config.METRICS_PREFIX}_run_duration_seconds {duration:g}")
+
+        return "\n".join(lines) + "\n"
+
+    def to_summary(self, process_name: str) -> dict:
+        """Summarize all metrics in a compact dictionary.
+        Histograms are reduced to count, sum, min, max and mean.
+
+        Args:
+            process_name: The name of the process from OpenOrchestrator.
+
+        Returns:
+            A dictionary that can be serialized to json.
+        """
+        finished_at = datetime.now()
+        histograms = {}
+        for (name, labels), values in sorted(self.histograms.items()):
+            histograms[name + _format_labels(labels)] = {
+                "count": len(values),
+                "sum": round(sum(values), 4),
+                "min": round(min(values), 4),
+                "max": round(max(values), 4),
+                "mean": round(sum(values) / len(values), 4)
+            }
+
+        return {
+            "process": process_name,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": finished_at.isoformat(timespec="seconds"),
+            "duration_seconds": round((finished_at - self.started_at).total_seconds(), 3),
+            "counters": {name + _format_labels(labels): value for (name, labels), value in sorted(self.counters.items())},
+            "histograms": histograms
+        }
+
+    def write(self, folder: str, process_name: str) -> tuple[str, str]:
+        """Write the metrics to the given folder.
+        The Prometheus file is overwritten on every run, so a textfile collector always reads the latest run.
+        It is written to a temporary file first and then moved into place, so it is never read half-written.
+        The json summary is timestamped, so earlier runs are kept for comparison.
+
+        Args:
+            folder: The folder to write the metrics files to.
+            process_name: The name of the process from OpenOrchestrator.
+
+        Returns:
+            The paths of the Prometheus file and the json summary.
+        """
+        os.makedirs(folder, exist_ok=True)
+
+        prometheus_path = os.path.join(folder, f"{config.METRICS_PREFIX}.prom")
+        temp_path = f"{prometheus_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(self.to_prometheus())
+        os.replace(temp_path, prometheus_path)
+
+        summary_path = os.path.join(folder, f"{config.METRICS_PREFIX}_{self.started_at:%Y%m%d_%H%M%S}.json")
+        with open(summary_path, "w", encoding="utf-8") as file:
+            json.dump(self.to_summary(process_name), file, ensure_ascii=False, separators=(",", ":"))
+
+        return prometheus_path, summary_path
+
+
+def get_metrics_folder(orchestrator_connection: OrchestratorConnection) -> str:
+    """Get the folder to write metrics to from the process arguments, or config.METRICS_FOLDER if not set.
+
+    Args:
+        orchestrator_connection: The connection to OpenOrchestrator.
+
+    Returns:
+        The absolute path of the metrics folder.
+    """
+    process_arguments = json.loads(orchestrator_connection.process_arguments)
+    return process_arguments.get("metrics_folder", config.METRICS_FOLDER)
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    """Format a tuple of label pairs in the Prometheus label syntax, e.g. {endpoint="get_cases"}."""
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
@@ -0,0 +1,237 @@
+"""This module decides which queue element the robot should claim next.
+In fair share mode claims are interleaved across the jobs in the queue, so small jobs
+are not stuck behind large ones."""
+
+import json
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
+from OpenOrchestrator.database.queues import QueueElement, QueueStatus
+
+from robot_framework import config
+from robot_framework.metrics import RunMetrics
+
+
+@dataclass
+class Job:
+    """A job in the queue, i.e. all queue elements created from the same email."""
+    job_id: str
+    weight: float
+    created_date: datetime
+    references: deque[str] = field(default_factory=deque)
+    virtual_time: float = 0
+    in_progress: int = 0
+    first_claim: datetime | None = None
+
+
+class JobScheduler:
+    """Claims queue elements from config.QUEUE_NAME according to config.QUEUE_SCHEDULING.
+
+    'fifo' claims elements strictly in the order they were created.
+    'fair_share' claims from the job that has received the least work relative to its priority weight.
+    """
+
+    def __init__(self, orchestrator_connection: OrchestratorConnection, metrics: RunMetrics):
+        self.orchestrator_connection = orchestrator_connection
+        self.metrics = metrics
+        self.jobs: dict[str, Job] = {}
+        self.claims_since_refresh = 0
+        self.newest_created_date: datetime | None = None
+        self.seen_ids: set = set()
+
+    def next_queue_element(self) -> QueueElement | None:
+        """Claim the next queue element and set it to 'in progress'.
+
+        Returns:
+            The claimed queue element, or None if the queue is empty.
+        """
+        if config.QUEUE_SCHEDULING != "fair_share":
+            return self.orchestrator_connection.get_next_queue_element(config.QUEUE_NAME)
+
+        if not self._pending_jobs():
+            self._refresh(full=True)
+        elif self.claims_since_refresh >= config.SCHEDULER_REFRESH_INTERVAL:
+            self._refresh(full=False)
+
+        while self._pending_jobs():
+            job = min(self._pending_jobs(), key=lambda job: (job.virtual_time, job.created_date))
+            reference = job.references.popleft()
+
+            # The claim is made like the FIFO claim, only filtered on the reference.
+            queue_element = self.orchestrator_connection.get_next_queue_element(config.QUEUE_NAME, reference=reference)
+            if not queue_element:
+                # The element was claimed elsewhere since the last refresh.
+                continue
+
+            # The same CPR can be queued by several jobs, so the claimed element may belong to another job.
+            actual_job = self.jobs.get(_get_job_id(queue_element))
+            if actual_job is None:
+                job.references.appendleft(reference)
+                actual_job = self._add_job(queue_element, job.virtual_time)
+            elif actual_job is not job:
+                job.references.appendleft(reference)
+                if reference in actual_job.references:
+                    actual_job.references.remove(reference)
+
+            self._register_claim(actual_job, queue_element)
+            return queue_element
+
+        return None
+
+    def complete(self, queue_element: QueueElement) -> None:
+        """Register that a claimed queue element has been processed, whether it succeeded or failed.
+        Logs the completion latency of the job when its last element is processed.
+
+        Args:
+            queue_element: The processed queue element.
+        """
+        job = self.jobs.get(_get_job_id(queue_element))
+        if job is None:
+            return
+
+        job.in_progress -= 1
+        if not job.references and job.in_progress == 0:
+            completion = datetime.now() - job.created_date
+            self.metrics.observe("job_completion_seconds", completion.total_seconds(), config.METRICS_JOB_HISTOGRAM_BUCKETS)
+            self.orchestrator_connection.log_info(f"Job {job.job_id} completed {completion} after creation.")
+            del self.jobs[job.job_id]
+
+    def _pending_jobs(self) -> list[Job]:
+        """Get all known jobs that have queue elements waiting to be claimed."""
+        return [job for job in self.jobs.values() if job.references]
+
+    def _register_claim(self, job: Job, queue_element: QueueElement) -> None:
+        """Advance the virtual time of a job and log the queue wait on its first claim.
+
+        Args:
+            job: The job the claimed queue element belongs to.
+            queue_element: The claimed queue element.
+        """
+        job.virtual_time += 1 / job.weight
+        job.in_progress += 1
+        self.claims_since_refresh += 1
+
+        if job.first_claim is None:
+            job.first_claim = datetime.now()
+            if self._is_job_started(job, queue_element):
+                self.orchestrator_connection.log_info(f"Job {job.job_id} resumed.")
+            else:
+                queue_wait = job.first_claim - job.created_date
+                self.metrics.observe("job_queue_wait_seconds", queue_wait.total_seconds(), config.METRICS_JOB_HISTOGRAM_BUCKETS)
+                self.orchestrator_connection.log_info(f"Job {job.job_id} started after waiting {queue_wait} in the queue.")
+
+    def _is_job_started(self, job: Job, claimed_element: QueueElement) -> bool:
+        """Check if any element of the job was claimed before, e.g. in an earlier run.
+        Elements are claimed in creation order within a job, so earlier claims are created
+        shortly before the oldest waiting element.
+
+        Args:
+            job: The job to check.
+            claimed_element: The element just claimed, which is ignored.
+
+        Returns:
+            True if the job has elements that are not new apart from the claimed one.
+        """
+        from_date = job.created_date - timedelta(minutes=config.JOB_CREATION_WINDOW_MINUTES)
+        for status in QueueStatus:
+            if status == QueueStatus.NEW:
+                continue
+
+            offset = 0
+            while True:
+                queue_elements = self.orchestrator_connection.get_queue_elements(
+                    config.QUEUE_NAME,
+                    status=status,
+                    offset=offset,
+                    limit=config.SCHEDULER_PAGE_SIZE,
+                    from_date=from_date,
+                    to_date=job.created_date)
+
+                if any(queue_element.id != claimed_element.id and _get_job_id(queue_element) == job.job_id for queue_element in queue_elements):
+                    return True
+
+                if len(queue_elements) < config.SCHEDULER_PAGE_SIZE:
+                    break
+                offset += config.SCHEDULER_PAGE_SIZE
+
+        return False
+
+    def _refresh(self, full: bool) -> None:
+        """Read new queue elements and add their references to the waiting references per job.
+        A full refresh rereads the whole queue and rebuilds the waiting references. Otherwise only
+        elements created since the newest element already seen are read, to pick up new jobs.
+        Jobs keep their virtual time across refreshes. New jobs start at the lowest virtual time
+        of the known jobs, so they share the throughput instead of taking all of it until they catch up.
+
+        Args:
+            full: Whether to reread the whole queue.
+        """
+        self.claims_since_refresh = 0
+        start_time = min((job.virtual_time for job in self.jobs.values() if job.references or job.in_progress), default=0)
+        if full:
+            self.newest_created_date = None
+            self.seen_ids.clear()
+            for job in self.jobs.values():
+                job.references.clear()
+
+        from_date = self.newest_created_date
+        offset = 0
+        while True:
+            queue_elements = self.orchestrator_connection.get_queue_elements(
+                config.QUEUE_NAME,
+                status=QueueStatus.NEW,
+                offset=offset,
+                limit=config.SCHEDULER_PAGE_SIZE,
+                from_date=from_date)
+
+            for queue_element in queue_elements:
+                # from_date is inclusive, so elements created at the newest date seen are read again.
+                if queue_element.id in self.seen_ids:
+                    continue
+                self.seen_ids.add(queue_element.id)
+
+                job = self.jobs.get(_get_job_id(queue_element)) or self._add_job(queue_element, start_time)
+                job.references.append(queue_element.reference)
+                job.created_date = min(job.created_date, queue_element.created_date)
+                self.newest_created_date = max(self.newest_created_date or queue_element.created_date, queue_element.created_date)
+
+            if len(queue_elements) < config.SCHEDULER_PAGE_SIZE:
+                break
+            offset += config.SCHEDULER_PAGE_SIZE
+
+        # Forget jobs that are neither waiting nor being processed, e.g. because they were handled elsewhere.
+        for job_id in [job.job_id for job in self.jobs.values() if not job.references and job.in_progress == 0]:
+            del self.jobs[job_id]
+
+        self.metrics.increment("scheduler_refreshes_total", kind="full" if full else "incremental")
+
+    def _add_job(self, queue_element: QueueElement, virtual_time: float) -> Job:
+        """Create a job from one of its queue elements and start tracking it.
+
+        Args:
+            queue_element: A queue element of the job.
+            virtual_time: The virtual time the job starts at.
+
+        Returns:
+            The new job.
+        """
+        data_dict = json.loads(queue_element.data)
+        priority = data_dict.get("Prioritet", config.DEFAULT_JOB_PRIORITY)
+
+        job = Job(
+            job_id=_get_job_id(queue_element),
+            weight=config.JOB_PRIORITY_WEIGHTS.get(priority, config.JOB_PRIORITY_WEIGHTS[config.DEFAULT_JOB_PRIORITY]),
+            created_date=queue_element.created_date,
+            virtual_time=virtual_time
+        )
+        self.jobs[job.job_id] = job
+        return job
+
+
+def _get_job_id(queue_element: QueueElement) -> str:
+    """Get the identity of the job a queue element belongs to.
+    Each email gets its own data bucket, so the data bucket key identifies the job.
+    """
+    return json.loads(queue_element.data)["Notat tekst"]
@@ -13,14 +13,16 @@ from itk_dev_shared_components.smtp import smtp_util
 
 from robot_framework import soup_mail
 from robot_framework import config
+from robot_framework.metrics import RunMetrics
 
 
-def create_queue_from_emails(orchestrator_connection: OrchestratorConnection, graph_access: GraphAccess):
+def create_queue_from_emails(orchestrator_connection: OrchestratorConnection, graph_access: GraphAccess, metrics: RunMetrics):
     """Create a queue by reading emails and delete the emails after.
 
     Args:
         orchestrator_connection: A way to access the orchestrator to create the queue elements
         graph_access: A token to access emails
+        metrics: The metrics of the current run
     """
     # Check mailbox for emails to process
     emails = _get_emails(graph_access)
@@ -51,6 +53,8 @@ def create_queue_from_emails(orchestrator_connection: OrchestratorConnection, gr
                 references = list_of_ids,
                 data=[json.dumps(data_dict, ensure_ascii=False)] * len(list_of_ids),
                 created_by="Robot")
+            metrics.increment("cprs_queued_total", len(list_of_ids))
+        metrics.increment("emails_ingested_total", status="accepted" if is_user_recognized else "blocked")
         _send_status_email(user_email, is_user_recognized, data_dict["Sagsoverskrift"])
         graph_mail.delete_email(email, graph_access)
 
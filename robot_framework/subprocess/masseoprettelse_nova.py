@@ -5,7 +5,7 @@ import uuid
 import pyodbc
 
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
-from OpenOrchestrator.database.queues import QueueStatus
+from OpenOrchestrator.database.queues import QueueElement, QueueStatus
 from itk_dev_shared_components.kmd_nova import nova_notes, nova_cases
 from itk_dev_shared_components.kmd_nova.authentication import NovaAccess
 from itk_dev_shared_components.kmd_nova.nova_objects import NovaCase, CaseParty, Department
@@ -13,38 +13,89 @@ from itk_dev_shared_components.kmd_nova import cpr as nova_cpr
 from requests.exceptions import HTTPError
 
 from robot_framework import config
+from robot_framework.metrics import RunMetrics
+from robot_framework.scheduling import JobScheduler
 
 
-def create_notes_from_queue(orchestrator_connection: OrchestratorConnection, nova_access: NovaAccess, queue_element_count: list[int]):
+def create_notes_from_queue(orchestrator_connection: OrchestratorConnection, nova_access: NovaAccess, queue_element_count: list[int], metrics: RunMetrics):
     """ Load queue elements and write notes to KMD Nova
 
     Args:
         orchestrator_connection: A way to read the queue elements
         nova_access: A token to write the notes
+        metrics: The metrics of the current run
     """
+    # All elements from the same email share a data bucket, so the text is only read once per key.
+    bucket_cache = {}
+    scheduler = JobScheduler(orchestrator_connection, metrics)
+
     while queue_element_count[0] < config.MAX_TASK_COUNT:
-        queue_element = orchestrator_connection.get_next_queue_element(config.QUEUE_NAME)
+        queue_element = scheduler.next_queue_element()
         if not queue_element:
             return
 
         queue_element_count[0] += 1
-        data_dict = json.loads(queue_element.data)
-        cases = nova_cases.get_cases(nova_access, cpr = queue_element.reference)
+        # Failures that stop the process are counted here before they propagate.
+        try:
+            _process_element(queue_element, orchestrator_connection, nova_access, metrics, bucket_cache)
+        except HTTPError:
+            metrics.increment("queue_elements_failed_total", reason="http_error")
+            scheduler.complete(queue_element)
+            raise
+        # A missing form field or an unknown department in the queue element data.
+        except KeyError:
+            metrics.increment("queue_elements_failed_total", reason="invalid_data")
+            raise
+        except LookupError:
+            metrics.increment("queue_elements_failed_total", reason="name_not_found")
+            raise
+        # We want to count every failure, the exception is raised again.
+        # pylint: disable-next = broad-exception-caught
+        except Exception:
+            metrics.increment("queue_elements_failed_total", reason="other")
+            raise
+
+        scheduler.complete(queue_element)
+
+
+def _process_element(queue_element: QueueElement, orchestrator_connection: OrchestratorConnection, nova_access: NovaAccess, metrics: RunMetrics, bucket_cache: dict[str, str]):
+    """Create the note of a single queue element in KMD Nova, creating the case first if needed.
+    The queue element is marked as done, or as failed if the case is not found.
 
-        if data_dict["Brug eksisterende sag"] == "Valgt":
-            try:
-                case = _find_matching_case(data_dict["Sagsoverskrift"], cases)
-            except LookupError:
-                orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.FAILED, f"Sagsoverskrift '{data_dict['Sagsoverskrift']}' ikke fundet.")
-                continue
-        else:
-            name = _get_name_from_cpr(cpr = queue_element.reference, nova_access=nova_access, cases=cases)
-            case = _create_case(queue_element.reference, name, data_dict, nova_access)
+    Args:
+        queue_element: The queue element to process
+        orchestrator_connection: A way to set the status of the queue element
+        nova_access: A token to write the notes
+        metrics: The metrics of the current run
+        bucket_cache: Data bucket texts already read, keyed by data bucket key
+    """
+    data_dict = json.loads(queue_element.data)
+    with metrics.time("nova_request_duration_seconds", endpoint="get_cases"):
+        cases = nova_cases.get_cases(nova_access, cpr = queue_element.reference)
 
+    if data_dict["Brug eksisterende sag"] == "Valgt":
+        case_title = data_dict["Sagsoverskrift"]
         try:
+            case = _find_matching_case(case_title, cases)
+        except LookupError:
+            orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.FAILED, f"Sagsoverskrift '{case_title}' ikke fundet.")
+            metrics.increment("queue_elements_failed_total", reason="case_not_found")
+            return
+    else:
+        name = _get_name_from_cpr(cpr = queue_element.reference, nova_access=nova_access, cases=cases, metrics=metrics)
+        case = _create_case(queue_element.reference, name, data_dict, nova_access, metrics)
+
+    try:
+        bucket_key = data_dict["Notat tekst"]
+        if bucket_key in bucket_cache:
+            metrics.increment("bucket_cache_requests_total", result="hit")
+        else:
+            metrics.increment("bucket_cache_requests_total", result="miss")
             data_bucket_conn_string = orchestrator_connection.get_constant(config.DATA_BUCKETS).value
-            text = _get_bucket_data(data_dict["Notat tekst"], data_bucket_conn_string)
+            bucket_cache[bucket_key] = _get_bucket_data(bucket_key, data_bucket_conn_string)
+        text = bucket_cache[bucket_key]
 
+        with metrics.time("nova_request_duration_seconds", endpoint="add_text_note"):
             nova_notes.add_text_note(
                 case.uuid,
                 data_dict["Notat overskrift"],
@@ -53,27 +104,31 @@ def create_notes_from_queue(orchestrator_connection: OrchestratorConnection, nov
                 True,
                 nova_access)
 
-            if data_dict["Brug eksisterende sag"] == "Ikke valgt" and data_dict["Afslut sag"] == "Valgt":
+        if data_dict["Brug eksisterende sag"] == "Ikke valgt" and data_dict["Afslut sag"] == "Valgt":
+            with metrics.time("nova_request_duration_seconds", endpoint="set_case_state"):
                 nova_cases.set_case_state(case.uuid, "Afsluttet", nova_access)
 
-        except HTTPError as e:
-            orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.FAILED, json.loads(e.response.text)["title"])
-            raise e
+    except HTTPError as e:
+        orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.FAILED, json.loads(e.response.text)["title"])
+        raise e
 
-        orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.DONE)
+    orchestrator_connection.set_queue_element_status(queue_element.id, QueueStatus.DONE)
+    metrics.increment("queue_elements_done_total")
 
 
-def _get_name_from_cpr(cpr: str, nova_access: NovaAccess, cases: list[NovaCase]) -> str:
+def _get_name_from_cpr(cpr: str, nova_access: NovaAccess, cases: list[NovaCase], metrics: RunMetrics) -> str:
     """Find name from lookup by address, and if not found (such as when using test CPRs) do a lookup in cases.
 
     Args:
         cpr: ÍD of the person we are looking for.
         nova_access: A token to access the KMD Nova API.
+        metrics: The metrics of the current run.
 
     Returns:
         The name of the person with the provided CPR.
     """
-    address = nova_cpr.get_address_by_cpr(cpr, nova_access)
+    with metrics.time("nova_request_duration_seconds", endpoint="get_address_by_cpr"):
+        address = nova_cpr.get_address_by_cpr(cpr, nova_access)
     if address:
         return address['name']
 
@@ -85,7 +140,7 @@ def _get_name_from_cpr(cpr: str, nova_access: NovaAccess, cases: list[NovaCase])
     raise LookupError(f"No name was found for {cpr}")
 
 
-def _create_case(ident: str, name: str, data_dict: dict, nova_access: NovaAccess) -> NovaCase:
+def _create_case(ident: str, name: str, data_dict: dict, nova_access: NovaAccess, metrics: RunMetrics) -> NovaCase:
     """Create a Nova case based on email data.
 
     Args:
@@ -93,6 +148,7 @@ def _create_case(ident: str, name: str, data_dict: dict, nova_access: NovaAccess
         name: The name of the person we are looking for
         data_dict: A dictionary object containing the data from the case
         nova_access: An access token for accessing the KMD Nova API
+        metrics: The metrics of the current run
 
     Returns:
         New NovaCase with data defined
@@ -124,7 +180,8 @@ def _create_case(ident: str, name: str, data_dict: dict, nova_access: NovaAccess
         security_unit=security_unit
     )
 
-    nova_cases.add_case(case, nova_access)
+    with metrics.time("nova_request_duration_seconds", endpoint="add_case"):
+        nova_cases.add_case(case, nova_access)
     return case
 
 